@@ -1,112 +1,286 @@
 import os
 import subprocess
 import logging
+import logging.handlers
 import re
 import json
+import concurrent.futures
+import itertools
+import collections
+import heapq
 import threading
+import selectors
+import codecs
+import locale
 import psutil
 import time
 import shlex
-from functools import partial  # Added import for proper lambda capture
+import signal
+import socket
 
 # Replace PyQt5 imports with PyQt6 imports:
 from PyQt6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit,
-    QLineEdit, QPushButton, QMessageBox, QInputDialog, QProgressDialog, QTabWidget
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
+    QPlainTextEdit, QLineEdit, QPushButton, QMessageBox, QInputDialog, QProgressDialog, QTabWidget
 )
-from PyQt6.QtCore import QTimer, Qt, QEvent, QThread, pyqtSignal, QSize
-from PyQt6.QtGui import QPainter, QColor, QFont, QLinearGradient  # add QLinearGradient
+from PyQt6.QtCore import QTimer, Qt, QEvent, QThread, QThreadPool, QRunnable, QObject, pyqtSignal, QSize
+from PyQt6.QtGui import QPainter, QPixmap, QColor, QFont, QLinearGradient, QTextCursor, QTextCharFormat
 import sys
 
-try:
-    import GPUtil  # Optional: for GPU monitoring
-except ImportError:
-    GPUtil = None
+# google.genai and the optional GPU libraries are imported on first use to keep startup fast:
+# genai/types are loaded by _ensure_genai(), pynvml/GPUtil by GeminiSysAdminUI.StatsSampler.
+genai = None
+types = None
 
-from google import genai
-from google.genai import types
+def _ensure_genai():
+    """Imports the Gemini SDK on first use."""
+    global genai, types
+    if genai is None:
+        from google import genai as _genai
+        from google.genai import types as _types
+        genai, types = _genai, _types
 
 # --- 0. Logging configuration ---
 # Log information is displayed in the 'gemini_sys_assistant.log' file and also in the console.
+# The file is rotated at 5 MB, and records are written in batches of up to 64
+# (errors are written immediately, and logging.shutdown() flushes the rest at exit).
+LOG_FILE = "gemini_sys_assistant.log"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+_log_file_handler = logging.handlers.RotatingFileHandler(
+    LOG_FILE, maxBytes=5_000_000, backupCount=3, encoding="utf-8"
+)
+_log_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))  # basicConfig only formats the buffer
+_log_buffer = logging.handlers.MemoryHandler(capacity=64, flushLevel=logging.ERROR, target=_log_file_handler)
 logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    format=LOG_FORMAT,
                     handlers=[
-                        logging.FileHandler("gemini_sys_assistant.log"),
+                        _log_buffer,
                         logging.StreamHandler() # Display log in console
                     ])
 
 logging.info("Gemini System Assistant started.")
 
+try:
+    import orjson  # Optional: faster JSON (de)serialization
+except ImportError:
+    orjson = None
+
+def _read_json(path):
+    """Reads and parses a JSON file, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())  # orjson.JSONDecodeError subclasses json's
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_json(path, obj):
+    """Writes obj as indented JSON to path atomically, using orjson when it is installed."""
+    # Write to a temporary file and swap it in, so a crash never leaves a half-written file
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())  # the data must be on disk before the rename makes it visible
+    os.replace(tmp_path, path)  # atomic on POSIX
+
 # --- User trusted commands file configuration ---
 USER_TRUSTED_COMMANDS_FILE = 'user_trusted_commands.json'
-# This list is loaded empty at first and then read from the file
-user_trusted_commands = [] 
+# Trusted commands are exact command strings, kept in a set for O(1) lookups.
+# This set is loaded empty at first and then read from the file
+user_trusted_commands: set[str] = set()
+# What the file currently holds, so saves without any change are skipped
+_saved_trusted_commands: frozenset[str] | None = None
 
 def load_user_trusted_commands():
     """Loads the user trusted commands from a JSON file."""
-    global user_trusted_commands
-    if os.path.exists(USER_TRUSTED_COMMANDS_FILE):
+    global user_trusted_commands, _saved_trusted_commands
+    _saved_trusted_commands = None
+    if os.path.isfile(USER_TRUSTED_COMMANDS_FILE):
         try:
-            with open(USER_TRUSTED_COMMANDS_FILE, 'r', encoding='utf-8') as f:
-                user_trusted_commands = json.load(f)
+            user_trusted_commands = set(_read_json(USER_TRUSTED_COMMANDS_FILE))
+            _saved_trusted_commands = frozenset(user_trusted_commands)
             logging.info(f"User trusted commands loaded from '{USER_TRUSTED_COMMANDS_FILE}'.")
         except json.JSONDecodeError as e:
             logging.error(f"Error reading JSON file of trusted commands: {e}")
-            user_trusted_commands = [] # Clears the list to prevent corrupted data
+            user_trusted_commands = set() # Clears the set to prevent corrupted data
         except Exception as e:
             logging.error(f"Unknown error loading trusted commands: {e}")
-            user_trusted_commands = []
+            user_trusted_commands = set()
     else:
         logging.info("User trusted commands file not found. A new list will be created.")
-        user_trusted_commands = []
+        user_trusted_commands = set()
 
 def save_user_trusted_commands():
-    """Saves the user trusted commands to a JSON file."""
+    """Saves the user trusted commands to a JSON file, unless the file is already up to date."""
+    global _saved_trusted_commands
+    snapshot = frozenset(user_trusted_commands)
+    if snapshot == _saved_trusted_commands:
+        return
     try:
-        with open(USER_TRUSTED_COMMANDS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(user_trusted_commands, f, indent=4, ensure_ascii=False)
+        _write_json(USER_TRUSTED_COMMANDS_FILE, sorted(snapshot))
+        _saved_trusted_commands = snapshot
         logging.info(f"User trusted commands saved to '{USER_TRUSTED_COMMANDS_FILE}'.")
     except Exception as e:
         logging.error(f"Error saving user trusted commands: {e}")
 
 # --- 2. System information gathering functions ---
+# These read kernel interfaces through psutil instead of spawning df/free/ps/ip/uptime.
+# The original subprocess versions are kept below as fallbacks if psutil fails.
+# Results are cached together in the snapshot below, not per helper.
+
+def _format_bytes(n):
+    """Formats a byte count in the same short style as 'df -h' / 'free -h'."""
+    for unit in ("B", "K", "M", "G", "T"):
+        if abs(n) < 1024 or unit == "T":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
 def get_disk_usage():
+    """Returns disk space of mounted partitions using psutil."""
+    try:
+        lines = [f"{'Filesystem':<20} {'Size':>7} {'Used':>7} {'Avail':>7} {'Use%':>5} Mounted on"]
+        for part in psutil.disk_partitions(all=False):
+            try:
+                usage = psutil.disk_usage(part.mountpoint)
+            except OSError:
+                continue  # e.g. unreadable or vanished mount point
+            lines.append(
+                f"{part.device:<20} {_format_bytes(usage.total):>7} {_format_bytes(usage.used):>7} "
+                f"{_format_bytes(usage.free):>7} {usage.percent:>4.0f}% {part.mountpoint}"
+            )
+        return "Disk Space:\n" + "\n".join(lines)
+    except (psutil.Error, OSError) as e:
+        logging.warning(f"psutil disk query failed, falling back to 'df -h': {e}")
+        return _get_disk_usage_fallback()
+
+def get_memory_usage():
+    """Returns memory and swap usage using psutil."""
+    try:
+        vm = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        buff_cache = getattr(vm, "buffers", 0) + getattr(vm, "cached", 0)
+        lines = [
+            f"{'':<6}{'total':>10}{'used':>10}{'free':>10}{'shared':>10}{'buff/cache':>12}{'available':>11}",
+            f"{'Mem:':<6}{_format_bytes(vm.total):>10}{_format_bytes(vm.used):>10}{_format_bytes(vm.free):>10}"
+            f"{_format_bytes(getattr(vm, 'shared', 0)):>10}{_format_bytes(buff_cache):>12}{_format_bytes(vm.available):>11}",
+            f"{'Swap:':<6}{_format_bytes(swap.total):>10}{_format_bytes(swap.used):>10}{_format_bytes(swap.free):>10}",
+        ]
+        return "Memory Usage:\n" + "\n".join(lines)
+    except (psutil.Error, OSError) as e:
+        logging.warning(f"psutil memory query failed, falling back to 'free -h': {e}")
+        return _get_memory_usage_fallback()
+
+def get_running_processes():
+    """Returns top 10 processes by memory usage using psutil."""
+    try:
+        # %CPU is averaged over each process's lifetime, as 'ps aux' does: cpu_percent would be
+        # 0.0 for every process the first time it is seen
+        attrs = ['pid', 'name', 'username', 'memory_percent', 'cpu_times', 'create_time']
+        # Only the top 10 are kept while scanning, instead of sorting every process
+        top = heapq.nlargest(
+            10, (p.info for p in psutil.process_iter(attrs)),
+            key=lambda info: info['memory_percent'] or 0
+        )
+        now = time.time()
+        lines = [f"{'USER':<12} {'PID':>7} {'%MEM':>5} {'%CPU':>5} COMMAND"]
+        for info in top:
+            times, started = info['cpu_times'], info['create_time']
+            age = now - started if started else 0
+            cpu = (times.user + times.system) / age * 100 if times and age > 0 else 0.0
+            lines.append(
+                f"{(info['username'] or '?')[:12]:<12} {info['pid']:>7} "
+                f"{info['memory_percent'] or 0:>5.1f} {cpu:>5.1f} {info['name']}"
+            )
+        return "Top 10 Processes by Memory Usage:\n" + "\n".join(lines)
+    except (psutil.Error, OSError) as e:
+        logging.warning(f"psutil process query failed, falling back to 'ps aux': {e}")
+        return _get_running_processes_fallback()
+
+def get_network_interfaces():
+    """Returns network interfaces status using psutil."""
+    family_names = {socket.AF_INET: "inet", socket.AF_INET6: "inet6", psutil.AF_LINK: "link"}
+    try:
+        addrs = psutil.net_if_addrs()
+        stats = psutil.net_if_stats()
+        lines = []
+        for name, if_addrs in addrs.items():
+            st = stats.get(name)
+            if st is not None:
+                state = "UP" if st.isup else "DOWN"
+                lines.append(f"{name}: state {state} mtu {st.mtu} speed {st.speed}Mb/s")
+            else:
+                lines.append(f"{name}:")
+            for addr in if_addrs:
+                family = family_names.get(addr.family, str(addr.family))
+                netmask = f" netmask {addr.netmask}" if addr.netmask else ""
+                lines.append(f"    {family} {addr.address}{netmask}")
+        return "Network Interfaces Status:\n" + "\n".join(lines)
+    except (psutil.Error, OSError) as e:
+        logging.warning(f"psutil network query failed, falling back to 'ip a': {e}")
+        return _get_network_interfaces_fallback()
+
+def get_system_uptime():
+    """Returns system uptime and load average using psutil."""
+    try:
+        # CLOCK_BOOTTIME is the uptime itself, so /proc/stat is not re-read for the boot time
+        seconds = int(time.clock_gettime(time.CLOCK_BOOTTIME))
+        days, rem = divmod(seconds, 86400)
+        hours, rem = divmod(rem, 3600)
+        minutes = rem // 60
+        load1, load5, load15 = psutil.getloadavg()
+        users = len(psutil.users())
+        return (
+            "System Uptime:\n"
+            f"up {days} days, {hours:02d}:{minutes:02d}, {users} users, "
+            f"load average: {load1:.2f}, {load5:.2f}, {load15:.2f}"
+        )
+    except (psutil.Error, OSError) as e:
+        logging.warning(f"psutil uptime query failed, falling back to 'uptime': {e}")
+        return _get_system_uptime_fallback()
+
+# --- Subprocess fallbacks, used only if psutil raises ---
+# Output is decoded as UTF-8 explicitly, so a stray byte never raises UnicodeDecodeError.
+def _get_disk_usage_fallback():
     """Returns disk space using 'df -h'."""
     try:
-        result = subprocess.run(['df', '-h'], capture_output=True, text=True, check=True)
+        result = subprocess.run(['df', '-h'], capture_output=True, encoding='utf-8', errors='replace', check=True)
         return "Disk Space:\n" + result.stdout
     except subprocess.CalledProcessError as e:
         logging.error(f"Error getting disk space: {e.stderr}")
         return f"Error getting disk space: {e.stderr}"
 
-def get_memory_usage():
+def _get_memory_usage_fallback():
     """Returns memory usage using 'free -h'."""
     try:
-        result = subprocess.run(['free', '-h'], capture_output=True, text=True, check=True)
+        result = subprocess.run(['free', '-h'], capture_output=True, encoding='utf-8', errors='replace', check=True)
         return "Memory Usage:\n" + result.stdout
     except subprocess.CalledProcessError as e:
         logging.error(f"Error getting memory usage: {e.stderr}")
         return f"Error getting memory usage: {e.stderr}"
 
-def get_running_processes():
+def _get_running_processes_fallback():
     """Returns top 10 processes by memory usage using 'ps aux'."""
     try:
-        result = subprocess.run(['ps', 'aux', '--sort=-%mem'], capture_output=True, text=True, check=True)
+        result = subprocess.run(['ps', 'aux', '--sort=-%mem'], capture_output=True, encoding='utf-8', errors='replace', check=True)
         lines = result.stdout.splitlines()
         return "Top 10 Processes by Memory Usage:\n" + "\n".join(lines[:11]) # Includes header
     except subprocess.CalledProcessError as e:
         logging.error(f"Error getting processes: {e.stderr}")
         return f"Error getting processes: {e.stderr}"
 
-def get_network_interfaces():
+def _get_network_interfaces_fallback():
     """Returns network interfaces status using 'ip a' or 'ifconfig'."""
     try:
-        result = subprocess.run(['ip', 'a'], capture_output=True, text=True, check=True)
+        result = subprocess.run(['ip', 'a'], capture_output=True, encoding='utf-8', errors='replace', check=True)
         return "Network Interfaces Status:\n" + result.stdout
     except FileNotFoundError:
         logging.warning("Command 'ip' not found. Trying 'ifconfig'.")
         try:
-            result = subprocess.run(['ifconfig'], capture_output=True, text=True, check=True)
+            result = subprocess.run(['ifconfig'], capture_output=True, encoding='utf-8', errors='replace', check=True)
             return "Network Interfaces Status (using ifconfig):\n" + result.stdout
         except FileNotFoundError:
             logging.error("Neither 'ip' nor 'ifconfig' found.")
@@ -118,15 +292,59 @@ def get_network_interfaces():
         logging.error(f"Error getting network status (ip): {e.stderr}")
         return f"Error getting network status (ip): {e.stderr}"
 
-def get_system_uptime():
+def _get_system_uptime_fallback():
     """Returns system uptime using 'uptime'."""
     try:
-        result = subprocess.run(['uptime'], capture_output=True, text=True, check=True)
+        result = subprocess.run(['uptime'], capture_output=True, encoding='utf-8', errors='replace', check=True)
         return "System Uptime:\n" + result.stdout
     except subprocess.CalledProcessError as e:
         logging.error(f"Error getting uptime: {e.stderr}")
         return f"Error getting uptime: {e.stderr}"
 
+# --- System info snapshot cache ---
+# Consecutive queries within SYSTEM_CONTEXT_TTL seconds reuse the same snapshot
+# instead of gathering everything again. The 'refresh' command invalidates it.
+SYSTEM_CONTEXT_TTL = 10.0
+# Interface state rarely changes mid-conversation, so that section is kept longer
+NETWORK_INFO_TTL = 30.0
+_ctx_cache = {"ts": 0.0, "net_ts": 0.0, "sections": ()}
+_ctx_lock = threading.Lock()  # the cache is read from the GUI thread and the Gemini worker
+# The collectors are independent, so they run side by side on a small pool
+_SYSTEM_INFO_COLLECTORS = (
+    get_disk_usage,
+    get_memory_usage,
+    get_running_processes,
+    get_network_interfaces,
+    get_system_uptime,
+)
+_NETWORK_INDEX = _SYSTEM_INFO_COLLECTORS.index(get_network_interfaces)
+_info_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=len(_SYSTEM_INFO_COLLECTORS), thread_name_prefix="sysinfo"
+)
+
+def get_system_snapshot(ttl=SYSTEM_CONTEXT_TTL):
+    """Returns the (disk, memory, processes, network, uptime) info tuple, cached for ttl seconds."""
+    with _ctx_lock:
+        now = time.monotonic()
+        old = _ctx_cache["sections"]
+        if not old or now - _ctx_cache["ts"] >= ttl:
+            reuse_network = bool(old) and now - _ctx_cache["net_ts"] < NETWORK_INFO_TTL
+            futures = [
+                None if reuse_network and i == _NETWORK_INDEX else _info_pool.submit(collector)
+                for i, collector in enumerate(_SYSTEM_INFO_COLLECTORS)
+            ]
+            # keeps the fixed order
+            sections = tuple(old[i] if f is None else f.result() for i, f in enumerate(futures))
+            _ctx_cache.update(ts=now, sections=sections)
+            if not reuse_network:
+                _ctx_cache["net_ts"] = now
+        return _ctx_cache["sections"]
+
+def invalidate_system_context():
+    """Drops the cached snapshot so the next query gathers fresh system info."""
+    with _ctx_lock:
+        _ctx_cache.update(ts=0.0, sections=())
+
 # --- 3. Safe command execution module (use with caution) ---
 # This section is responsible for executing the suggested commands by Gemini.
 # **Extremely important: Only non-destructive and approved commands should be whitelisted.**
@@ -171,40 +389,164 @@ SAFE_COMMANDS_WHITELIST = [
     r'^sudo\s+clamscan\s+.*$', # Allows clamscan with any arguments (e.g., -r, --bell, -i, /path)
     # If you have a specific command in mind, add the appropriate pattern
 ]
+# All patterns are fused into one alternation compiled at import, so a safety check is a
+# single match call instead of one call per pattern. The per-pattern anchors are stripped
+# and the whole group is matched with fullmatch, so every pattern must match the entire
+# command ('$' alone would still accept a trailing newline).
+def _strip_anchors(pattern):
+    return pattern.removeprefix('^').removesuffix('$')
+
+SAFE_COMMANDS_RE = re.compile(
+    "|".join(f"(?:{_strip_anchors(p)})" for p in SAFE_COMMANDS_WHITELIST)
+)
+# When every pattern starts with a literal program name, a command whose first word is not
+# one of them is rejected with a set lookup before the regex runs. The name only counts if
+# it is a whole word: followed by the end of the pattern or by a required whitespace.
+_LEADING_WORD_RE = re.compile(r'([\w\-]+)(?:\\s(?![*?{])|$)')
+
+def _safe_leading_words(patterns):
+    """Returns the set of leading program names, or None if any pattern lacks a literal one."""
+    words = set()
+    for pattern in patterns:
+        m = _LEADING_WORD_RE.match(_strip_anchors(pattern))
+        if m is None:
+            return None  # e.g. '^(lsblk|lscpu)$' or '^l[s]$': no fast path, regex only
+        words.add(m.group(1))
+    return frozenset(words)
+
+_SAFE_LEADING_WORDS = _safe_leading_words(SAFE_COMMANDS_WHITELIST)
+
+# Suggested commands are given by Gemini on their own line as "COMMAND: <cmd>"
+_COMMAND_RE = re.compile(r'^COMMAND:\s*(.*)$', re.MULTILINE)
+
+# Characters that need /bin/sh to interpret (pipes, &&, redirects, globs, expansions)
+_SHELL_METACHARS = frozenset('|&;<>()$`\\*?[]{}~!#\n')
+
+# Shell builtins have no executable for execvp to find and only work under a shell
+_SHELL_BUILTINS = frozenset({
+    "cd", "export", "source", ".", "alias", "unalias", "unset", "set", "eval", "exec",
+    "exit", "ulimit", "umask", "pushd", "popd", "dirs", "history", "shopt", "declare",
+    "readonly", "typeset", "local", "let", "trap", "wait", "jobs", "fg", "bg", "hash",
+})
+
+def _exec_args(command):
+    """
+    Returns (args, use_shell) for subprocess: an argv list when the command is a plain
+    program invocation, or the original string with use_shell=True when it needs a shell.
+    """
+    if not any(ch in _SHELL_METACHARS for ch in command):
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            argv = []
+        # VAR=value prefixes are shell assignments, not program names
+        if argv and argv[0] not in _SHELL_BUILTINS and "=" not in argv[0]:
+            return argv, False
+    return command, True
+
+# Graphical programs are launched detached, without a progress dialog or output capture
+GUI_APPS = frozenset({"google-chrome", "firefox", "chromium", "code", "gedit", "vlc", "nautilus", "dolphin"})
+
+# Bytes read from a command's stdout/stderr pipe at a time; the complete lines of each
+# read cross to the GUI thread as one signal
+COMMAND_READ_SIZE = 65536
+
+# Maximum number of commands running at the same time
+COMMAND_POOL_SIZE = 4
+
+# Separator line between the sections of the 'system status' output
+_STATUS_SEP = "\n" + "-" * 30 + "\n"
+
+# Gemini queries waiting or running before the send button is disabled
+GEMINI_MAX_PENDING = 4
+
+# Milliseconds between log file reads while the Logs tab is open
+LOG_REFRESH_MS = 2000
+
+# Milliseconds command output is buffered before being written to the chat area
+OUTPUT_FLUSH_MS = 50
+
+# Milliseconds closeEvent waits, in total, for the sampler and worker pools to finish
+SHUTDOWN_TIMEOUT_MS = 3000
+
+# Stylesheet shared by every command progress dialog
+_PROGRESS_QSS = """
+    QProgressDialog {
+        background-color: #232042;
+        color: #F2F2F2;
+        border-radius: 12px;
+        border: 1px solid #635985;
+    }
+    QProgressBar {
+        border: 1px solid #A3FFD6;
+        border-radius: 8px;
+        background: #18122B;
+        height: 18px;
+    }
+    QProgressBar::chunk {
+        background-color: #A3FFD6;
+        width: 20px;
+    }
+"""
 
 # --- 4. Main function to interact with Gemini ---
-def ask_gemini_about_system(query):
+# One client per API key, so repeated queries reuse its HTTP connection pool
+_GEMINI_CLIENT = None
+_GEMINI_KEY = None
+_GEMINI_CLIENT_LOCK = threading.Lock()
+GEMINI_MODEL = "gemini-2.5-flash-lite-preview-06-17"
+_GENERATE_CONTENT_CONFIG = None  # built with the client, identical for every query
+
+def _get_client(api_key):
+    """Returns the shared Gemini client, creating it on first use or when the key changed."""
+    global _GEMINI_CLIENT, _GEMINI_KEY, _GENERATE_CONTENT_CONFIG
+    with _GEMINI_CLIENT_LOCK:
+        if _GEMINI_CLIENT is None or _GEMINI_KEY != api_key:
+            _ensure_genai()
+            if _GENERATE_CONTENT_CONFIG is None:
+                _GENERATE_CONTENT_CONFIG = types.GenerateContentConfig(
+                    response_mime_type="text/plain",
+                )
+            _GEMINI_CLIENT = genai.Client(
+                api_key=api_key,
+            )
+            _GEMINI_KEY = api_key
+        return _GEMINI_CLIENT
+
+def reset_gemini_client():
+    """Drops the shared Gemini client; the next query creates a new one."""
+    global _GEMINI_CLIENT, _GEMINI_KEY
+    with _GEMINI_CLIENT_LOCK:
+        _GEMINI_CLIENT = None
+        _GEMINI_KEY = None
+
+# Static parts of the prompt, built once; only the system info and the question vary per call.
+# The static header is far below the minimum size for explicit context caching, so it is
+# simply resent with each query.
+SYSTEM_PROMPT_PREFIX = (
+    "You are an AI assistant helping the user manage the Kali Linux system.\n"
+    "Current system info:\n"
+)
+SYSTEM_PROMPT_SUFFIX = """
+Based on the above information and my question, please respond.
+If my question is about system status (disk, memory, processes, network or uptime),
+answer using only the above info.
+If you suggest a Linux command, output it on a separate line prefixed with `COMMAND:`.
+Example:
+COMMAND: ls -l /home/user
+COMMAND: systemctl status apache2
+COMMAND: ping google.com
+
+My question: """
+
+def ask_gemini_about_system(query, on_chunk=None):
     """
     Sends a query to Gemini including current system info as context.
+    If on_chunk is given, it is called with each streamed piece of the response and
+    the pieces are not accumulated; the return value is then "" or an error message.
     """
-    # Collecting current system information
-    disk_info = get_disk_usage()
-    memory_info = get_memory_usage()
-    processes_info = get_running_processes()
-    network_info = get_network_interfaces()
-    uptime_info = get_system_uptime()
-
-    # Structuring the information for Gemini (Prompt)
-    system_context = f"""
-    You are an AI assistant helping the user manage the Kali Linux system.
-    Current system info:
-    {disk_info}
-    {memory_info}
-    {processes_info}
-    {network_info}
-    {uptime_info}
-
-    Based on the above information and my question, please respond.
-    If my question is about system status (disk, memory, processes, network or uptime),
-    answer using only the above info.
-    If you suggest a Linux command, output it on a separate line prefixed with `COMMAND:`.
-    Example:
-    COMMAND: ls -l /home/user
-    COMMAND: systemctl status apache2
-    COMMAND: ping google.com
-
-    My question: {query}
-    """
+    # Collecting current system information (reused if gathered within the last few seconds)
+    sections = get_system_snapshot()
 
     try:
         api_key = os.environ.get("GEMINI_API_KEY")
@@ -215,30 +557,33 @@ def ask_gemini_about_system(query):
             )
             logging.error(err_msg)
             return err_msg
-        client = genai.Client(
-            api_key=api_key,
-        )
-        model = "gemini-2.5-flash-lite-preview-06-17"
+        client = _get_client(api_key)
+        # Structuring the information for Gemini (Prompt): one part per section instead of
+        # copying the snapshot into one big prompt string. Each section ends with the newline
+        # that used to join them, so the model sees the same text as before.
         contents = [
             types.Content(
                 role="user",
                 parts=[
-                    types.Part.from_text(text=system_context),
+                    types.Part.from_text(text=SYSTEM_PROMPT_PREFIX),
+                    *(types.Part.from_text(text=section + "\n") for section in sections),
+                    types.Part.from_text(text=SYSTEM_PROMPT_SUFFIX + query),
                 ],
             ),
         ]
-        generate_content_config = types.GenerateContentConfig(
-            response_mime_type="text/plain",
-        )
-        response_text = ""
+        parts = []  # joined once at the end instead of growing a string per chunk
         for chunk in client.models.generate_content_stream(
-            model=model,
+            model=GEMINI_MODEL,
             contents=contents,
-            config=generate_content_config,
+            config=_GENERATE_CONTENT_CONFIG,
         ):
-            if hasattr(chunk, "text"):
-                response_text += chunk.text
-        return response_text
+            text = chunk.text  # always present on stream chunks, may be None
+            if text:
+                if on_chunk is not None:
+                    on_chunk(text)
+                else:
+                    parts.append(text)
+        return "".join(parts)
     except Exception as e:
         err_msg = str(e)
         if "Temporary failure in name resolution" in err_msg or "Failed to establish a new connection" in err_msg:
@@ -251,26 +596,75 @@ def ask_gemini_about_system(query):
         logging.error(f"Error communicating with Gemini: {e}")
         return f"Error communicating with Gemini: {e}"
 
+# apt subcommands that prompt for confirmation, unless -y is already given anywhere.
+# The optional -S covers commands already rewritten for the sudo password prompt.
+_APT_YES_RE = re.compile(
+    r'^(sudo\s+(?:-S\s+)?apt\s+(?:install|upgrade|autoremove|purge))(?=\s|$)(?!.*\s-y(?:\s|$))'
+)
+
 def transform_apt_command(cmd):
     # Automatically add -y flag to apt commands if missing
-    if cmd.startswith("sudo apt install") and "-y" not in cmd:
-        cmd = cmd.replace("sudo apt install", "sudo apt install -y", 1)
-    elif cmd.startswith("sudo apt upgrade") and "-y" not in cmd:
-        cmd = cmd.replace("sudo apt upgrade", "sudo apt upgrade -y", 1)
-    elif cmd.startswith("sudo apt autoremove") and "-y" not in cmd:
-        cmd = cmd.replace("sudo apt autoremove", "sudo apt autoremove -y", 1)
-    elif cmd.startswith("sudo apt purge") and "-y" not in cmd:
-        cmd = cmd.replace("sudo apt purge", "sudo apt purge -y", 1)
-    return cmd
+    return _APT_YES_RE.sub(r'\1 -y', cmd, count=1)
+
+# Number of inputs kept for Up/Down history navigation
+CMD_HISTORY_SIZE = 500
+
+# Milliseconds between monitoring bar updates, overridable via GEMINI_MONITOR_INTERVAL_MS
+try:
+    MONITOR_INTERVAL_MS = max(500, int(os.getenv("GEMINI_MONITOR_INTERVAL_MS", "3000")))
+except ValueError:
+    MONITOR_INTERVAL_MS = 3000
+
+# Milliseconds between monitoring updates while the window is hidden or minimized
+MONITOR_HIDDEN_INTERVAL_MS = 10000
+
+# Seconds between disk usage queries (disk usage changes slowly)
+DISK_POLL_INTERVAL = 10.0
+
+# Seconds between GPUtil queries when NVML is not available
+GPUTIL_POLL_INTERVAL = 5.0
+
+# Seconds the sampler measures CPU time before its first reading, so that reading covers a
+# real interval instead of the few milliseconds since the thread started
+CPU_PRIME_INTERVAL = 0.5
+
+def _usage_color(percent):
+    # Smooth gradient: green (0%) -> yellow (50%) -> orange (75%) -> red (100%)
+    if percent < 50:
+        r = int(90 + (255-90)*(percent/50))
+        g = 255
+        b = 90 - int(90*(percent/50))
+        return QColor(r, g, b)
+    elif percent < 75:
+        r = 255
+        g = int(255 - (95 * ((percent-50)/25)))
+        b = 80
+        return QColor(r, g, b)
+    else:
+        r = 255
+        g = int(160 - (80 * ((percent-75)/25)))
+        b = 80 - int(80 * ((percent-75)/25))
+        return QColor(r, max(g,0), max(b,0))
 
 # New PyQt5 based UI class
 class MonitoringWidget(QWidget):
+    # Bar colours for every whole percentage, with the gradient and indicator shades
+    _COLOR_LUT = tuple(_usage_color(p) for p in range(101))
+    _LIGHT_LUT = tuple(c.lighter(120) for c in _COLOR_LUT)
+    _DARK_LUT = tuple(c.darker(120) for c in _COLOR_LUT)
+    _INDICATOR_LUT = tuple(c.darker(130) for c in _COLOR_LUT)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.cpu = 0
         self.ram = 0
         self.disk = 0
         self.gpu = None  # None means not available
+        self._shown = None  # rounded values of the last repaint
+        # Shadows, bar backgrounds and the bottom line only depend on the size and the
+        # number of bars, so they are drawn once into a pixmap and reused by paintEvent
+        self._bg_cache = None
+        self._bg_key = None
         self.setMinimumHeight(90)
         self.setMaximumHeight(110)
         self.setStyleSheet("background: transparent;")
@@ -280,25 +674,19 @@ class MonitoringWidget(QWidget):
         self.ram = ram
         self.disk = disk
         self.gpu = gpu
+        shown = (round(cpu), round(ram), round(disk), None if gpu is None else round(gpu))
+        if shown == self._shown:
+            return  # the bars and labels would look exactly the same
+        self._shown = shown
         self.update()
 
-    def _usage_color(self, percent):
-        # Smooth gradient: green (0%) -> yellow (50%) -> orange (75%) -> red (100%)
-        if percent < 50:
-            r = int(90 + (255-90)*(percent/50))
-            g = 255
-            b = 90 - int(90*(percent/50))
-            return QColor(r, g, b)
-        elif percent < 75:
-            r = 255
-            g = int(255 - (95 * ((percent-50)/25)))
-            b = 80
-            return QColor(r, g, b)
-        else:
-            r = 255
-            g = int(160 - (80 * ((percent-75)/25)))
-            b = 80 - int(80 * ((percent-75)/25))
-            return QColor(r, max(g,0), max(b,0))
+    def resizeEvent(self, event):
+        self._bg_cache = None
+        super().resizeEvent(event)
+
+    @staticmethod
+    def _color_index(percent):
+        return max(0, min(100, round(percent)))
 
     def _draw_gloss(self, painter, x, y, w, h):
         # Draw a glossy highlight on top of the bar
@@ -307,20 +695,22 @@ class MonitoringWidget(QWidget):
         painter.setPen(Qt.PenStyle.NoPen)
         painter.drawRoundedRect(x, y, w, h//2, 10, 10)
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        font = QFont('Segoe UI', 12, QFont.Weight.Bold)
-        painter.setFont(font)
-        stats = [("CPU", self.cpu), ("RAM", self.ram), ("Disk", self.disk)]
-        if self.gpu is not None:
-            stats.append(("GPU", self.gpu))
-        n = len(stats)
+    def _bar_layout(self, n):
         bar_w = max(120, (self.width() - 40 - (n-1)*30) // n)
-        bar_h = 36
-        spacing = 30
-        y = 22
-        for i, (label, percent) in enumerate(stats):
+        return bar_w, 36, 30, 22  # bar width, bar height, spacing, top
+
+    def _background(self, n):
+        key = (self.width(), self.height(), n)
+        if self._bg_cache is not None and self._bg_key == key:
+            return self._bg_cache
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        bar_w, bar_h, spacing, y = self._bar_layout(n)
+        for i in range(n):
             x = 20 + i * (bar_w + spacing)
             # Draw shadow
             painter.setPen(Qt.PenStyle.NoPen)
@@ -330,11 +720,31 @@ class MonitoringWidget(QWidget):
             painter.setBrush(QColor(35, 32, 66, 230))
             painter.setPen(QColor(90, 90, 120, 180))
             painter.drawRoundedRect(x, y, bar_w, bar_h, 12, 12)
+        # Draw a subtle bottom line for separation
+        painter.setPen(QColor(120, 255, 255, 60))
+        painter.drawLine(10, y+bar_h+10, self.width()-10, y+bar_h+10)
+        painter.end()
+        self._bg_cache, self._bg_key = pixmap, key
+        return pixmap
+
+    def paintEvent(self, event):
+        stats = [("CPU", self.cpu), ("RAM", self.ram), ("Disk", self.disk)]
+        if self.gpu is not None:
+            stats.append(("GPU", self.gpu))
+        n = len(stats)
+        background = self._background(n)
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, background)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setFont(QFont('Segoe UI', 11, QFont.Weight.Bold))
+        bar_w, bar_h, spacing, y = self._bar_layout(n)
+        for i, (label, percent) in enumerate(stats):
+            x = 20 + i * (bar_w + spacing)
             # Draw usage bar with gradient color
-            usage_color = self._usage_color(percent)
+            shade = self._color_index(percent)
             grad = QLinearGradient(x, y, x+bar_w, y+bar_h)
-            grad.setColorAt(0, usage_color.lighter(120))
-            grad.setColorAt(1, usage_color.darker(120))
+            grad.setColorAt(0, self._LIGHT_LUT[shade])
+            grad.setColorAt(1, self._DARK_LUT[shade])
             painter.setBrush(grad)
             painter.setPen(Qt.PenStyle.NoPen)
             painter.drawRoundedRect(x, y, int(bar_w * percent / 100), bar_h, 12, 12)
@@ -346,20 +756,16 @@ class MonitoringWidget(QWidget):
             painter.drawRoundedRect(x, y, bar_w, bar_h, 12, 12)
             # Draw text (label and percent)
             painter.setPen(QColor(230, 255, 255))
-            painter.setFont(QFont('Segoe UI', 11, QFont.Weight.Bold))
             painter.drawText(x+14, y+bar_h-12, f"{label}: {percent:.0f}%")
             # Draw animated circle indicator at the end of the bar
             circle_x = x + int(bar_w * percent / 100)
             circle_y = y + bar_h//2
-            painter.setBrush(usage_color.darker(130))
+            painter.setBrush(self._INDICATOR_LUT[shade])
             painter.setPen(QColor(80, 80, 80, 120))
             painter.drawEllipse(circle_x-8, circle_y-8, 16, 16)
             painter.setBrush(QColor(255,255,255,60))
             painter.setPen(Qt.PenStyle.NoPen)
             painter.drawEllipse(circle_x-4, circle_y-4, 8, 8)
-        # Draw a subtle bottom line for separation
-        painter.setPen(QColor(120, 255, 255, 60))
-        painter.drawLine(10, y+bar_h+10, self.width()-10, y+bar_h+10)
         painter.end()
 
     def sizeHint(self):
@@ -386,7 +792,7 @@ class GeminiSysAdminUI(QWidget):
                 color: #FFD6E0;
                 font-size: 15px;
             }
-            QTextEdit, QLineEdit {
+            QTextEdit, QPlainTextEdit, QLineEdit {
                 border-radius: 10px;
                 border: 1px solid #393053;
                 background-color: #232042;
@@ -405,22 +811,45 @@ class GeminiSysAdminUI(QWidget):
                 color: #232042;
             }
         """)
-        self.input_history = []
-        self.history_index = -1
-        self.cmd_history = []
+        self.cmd_history = collections.deque(maxlen=CMD_HISTORY_SIZE)  # oldest entries drop off
         self.history_index = -1
-        self.active_threads = []
-        self.loading_dialog = None  # Track loading dialog
+        # Gemini queries run one at a time on their own pool; later ones wait their turn
+        self.gemini_pool = QThreadPool(self)
+        self.gemini_pool.setMaxThreadCount(1)
+        self.gemini_workers = set()
+        self.status_workers = set()  # 'system status' requests being gathered
+        # Commands run on a small pool of reused threads instead of a new thread each
+        self.command_pool = QThreadPool(self)
+        self.command_pool.setMaxThreadCount(COMMAND_POOL_SIZE)
+        self.running_commands = set()
+        self.loading_dialog = None  # Most recently shown progress dialog
+        self._fmts = {}  # QTextCharFormat per output tag, built once
+        for tag in (None, *self.TAG_COLORS):
+            fmt = QTextCharFormat()
+            fmt.setForeground(QColor(self.TAG_COLORS.get(tag, "#F2F2F2")))
+            fmt.setFontWeight(QFont.Weight.Bold)
+            self._fmts[tag] = fmt
+        # Command output lines are buffered and written to the chat in one go per tick
+        self._pending_lines = []  # (tag, line)
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(OUTPUT_FLUSH_MS)
+        self._flush_timer.timeout.connect(self.flush_pending_output)
+        # Prompt dialogs, created on first use and reused for every later prompt
+        self._confirm_box = None
+        self._password_dialog = None
         load_user_trusted_commands()
         self.init_ui()  
         self.append_output("--- Gemini Sys Admin Assistant ---", "system")
         self.append_output("This is an experimental tool. Run system commands at your own risk.", "system")
         self.append_output("Type 'exit' to quit.", "system")
         self.append_output("Type 'system status' to view complete system info.", "system")
-        # Setup monitoring updates every second
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_monitoring)
-        self.timer.start(1000)
+        self.append_output("Type 'refresh' to gather fresh system info on the next query.", "system")
+        # Monitoring stats are sampled every MONITOR_INTERVAL_MS on a background thread,
+        # so a slow GPU query never stalls the UI
+        self.sampler = self.StatsSampler(MONITOR_INTERVAL_MS)
+        self.sampler.sample_ready.connect(self.on_stats_sampled, Qt.ConnectionType.QueuedConnection)
+        self.sampler.start()
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -437,18 +866,24 @@ class GeminiSysAdminUI(QWidget):
         
         # Create a QTabWidget for separate Chat and Log views
         self.tab_widget = QTabWidget()
-        # Chat area: reusing output_area as chat widget
-        self.chat_area = QTextEdit()
+        # Chat area: plain text with per-tag char formats keeps appends cheap on long sessions
+        self.chat_area = QPlainTextEdit()
         self.chat_area.setReadOnly(True)
+        self.chat_area.setMaximumBlockCount(5000)  # oldest lines are dropped past this
+        self.chat_area.setUndoRedoEnabled(False)  # read-only, so no undo stack to grow
         self.chat_area.setStyleSheet("""
             background-color:#232042; 
             color:#F2F2F2; 
             border-radius: 12px;
             border: 1px solid #635985;
         """)
-        # Log area: new text edit for log output
-        self.log_area = QTextEdit()
+        # Log area: new text edit for log output, filled incrementally from the log file
+        self.log_area = QPlainTextEdit()
         self.log_area.setReadOnly(True)
+        self.log_area.setMaximumBlockCount(5000)
+        self.log_area.setUndoRedoEnabled(False)
+        self._log_offset = 0  # bytes of the log file already shown
+        self._log_inode = None
         self.log_area.setStyleSheet("""
             background-color:#1E1E2D; 
             color:#A3FFD6; 
@@ -459,6 +894,11 @@ class GeminiSysAdminUI(QWidget):
         self.tab_widget.addTab(self.chat_area, "Chat")
         self.tab_widget.addTab(self.log_area, "Logs")
         layout.addWidget(self.tab_widget, stretch=1)
+        # The log is only read while the Logs tab is visible
+        self._log_timer = QTimer(self)
+        self._log_timer.setInterval(LOG_REFRESH_MS)
+        self._log_timer.timeout.connect(self.update_log_area)
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
         
         # Main input area remains in a separate layout
         input_layout = QHBoxLayout()
@@ -476,278 +916,182 @@ class GeminiSysAdminUI(QWidget):
         self.clear_button.clicked.connect(self.clear_output)
         self.command_input.returnPressed.connect(self.on_send)
 
-    def update_monitoring(self):
-        cpu = psutil.cpu_percent()
-        ram = psutil.virtual_memory().percent
-        disk = psutil.disk_usage('/').percent
-        gpu_percent = None
-        if GPUtil:
-            try:
-                gpus = GPUtil.getGPUs()
-                if gpus:
-                    gpu_percent = gpus[0].load * 100
-            except Exception:
-                gpu_percent = None
+    def on_stats_sampled(self, cpu, ram, disk, gpu_percent):
+        # set_stats skips the repaint itself when the displayed (rounded) values are unchanged
         self.monitoring_widget.set_stats(cpu, ram, disk, gpu_percent)
 
+    TAG_COLORS = {
+        "user": "#44AAFF",
+        "gemini": "#A3FFD6",
+        "system": "#FFD6E0",
+        "command": "#FF8888"
+    }
+
     def append_output(self, text, tag=None):
-        # Append chat messages to chat_area instead of the previous output_area
-        color_map = {
-            "user": "#44AAFF",
-            "gemini": "#A3FFD6",
-            "system": "#FFD6E0",
-            "command": "#FF8888"
-        }
-        color = color_map.get(tag, "#F2F2F2")
-        self.chat_area.append(f'<span style="color:{color}; font-weight:bold;">{text}</span>')
+        # Append chat messages to chat_area as a new line
+        self._append_lines(((text, tag),))
+
+    def _append_lines(self, lines):
+        """Appends (text, tag) pairs as new lines in one edit block."""
+        cursor = self.chat_area.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        # An answer still streaming at the end must continue above the new lines, so pin
+        # its cursor with a marker that stays put when text is inserted at its position
+        pins = []
+        for worker in self.gemini_workers:
+            if worker.cursor is not None and worker.cursor.atEnd():
+                pin = QTextCursor(worker.cursor)
+                pin.setKeepPositionOnInsert(True)
+                pins.append((worker, pin))
+        cursor.beginEditBlock()  # one layout update for the whole batch
+        for text, tag in lines:
+            self._insert_line(cursor, text, tag)
+        cursor.endEditBlock()
+        for worker, pin in pins:
+            worker.cursor.setPosition(pin.position())
+        self.chat_area.setTextCursor(cursor)  # keep the newest text in view
+
+    def _insert_line(self, cursor, text, tag):
+        if not self.chat_area.document().isEmpty():
+            cursor.insertBlock()
+        cursor.insertText(text, self._fmts.get(tag, self._fmts[None]))
+
+    def append_stream(self, text, tag=None, cursor=None):
+        """Appends text at cursor (default: the end of the last chat line), used for streamed responses."""
+        if cursor is None:
+            cursor = self.chat_area.textCursor()
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text, self._fmts.get(tag, self._fmts[None]))
+        if cursor.atEnd():
+            self.chat_area.setTextCursor(cursor)
         
-    # Optionally, add a method to update the log_area (e.g., reading from log file)
+    def on_tab_changed(self, index):
+        if self.tab_widget.widget(index) is self.log_area:
+            self.update_log_area()
+            self._log_timer.start()
+        else:
+            self._log_timer.stop()
+
     def update_log_area(self):
+        """Appends the lines written to the log file since the last call."""
+        _log_buffer.flush()  # show records still waiting in the write batch
         try:
-            with open("gemini_sys_assistant.log", "r", encoding="utf-8") as f:
-                log_content = f.read()
-            self.log_area.setPlainText(log_content)
-        except Exception as e:
+            with open(LOG_FILE, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self._log_inode or st.st_size < self._log_offset:
+                    # First read, or the file was rotated/truncated: start over
+                    self._log_inode = st.st_ino
+                    self._log_offset = 0
+                    self.log_area.clear()
+                f.seek(self._log_offset)
+                data = f.read()
+        except OSError as e:
             self.log_area.setPlainText(f"Error reading log file: {e}")
-            
-    # --- 4. Main function to interact with Gemini ---
-    def ask_gemini_about_system(self, query):
-        """
-        Sends a query to Gemini including current system info as context.
-        """
-        # Collecting current system information
-        disk_info = get_disk_usage()
-        memory_info = get_memory_usage()
-        processes_info = get_running_processes()
-        network_info = get_network_interfaces()
-        uptime_info = get_system_uptime()
-
-        # Structuring the information for Gemini (Prompt)
-        system_context = f"""
-        You are an AI assistant helping the user manage the Kali Linux system.
-        Current system info:
-        {disk_info}
-        {memory_info}
-        {processes_info}
-        {network_info}
-        {uptime_info}
-
-        Based on the above information and my question, please respond.
-        If my question is about system status (disk, memory, processes, network or uptime),
-        answer using only the above info.
-        If you suggest a Linux command, output it on a separate line prefixed with `COMMAND:`.
-        Example:
-        COMMAND: ls -l /home/user
-        COMMAND: systemctl status apache2
-        COMMAND: ping google.com
-
-        My question: {query}
-        """
-
-        try:
-            api_key = os.environ.get("GEMINI_API_KEY")
-            if not api_key:
-                err_msg = (
-                    "Error: Gemini API key not found.\n"
-                    "Please set the GEMINI_API_KEY environment variable."
-                )
-                logging.error(err_msg)
-                return err_msg
-            client = genai.Client(
-                api_key=api_key,
-            )
-            model = "gemini-2.5-flash-preview-05-20"
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_text(text=system_context),
-                    ],
-                ),
-            ]
-            generate_content_config = types.GenerateContentConfig(
-                response_mime_type="text/plain",
-            )
-            response_text = ""
-            for chunk in client.models.generate_content_stream(
-                model=model,
-                contents=contents,
-                config=generate_content_config,
-            ):
-                if hasattr(chunk, "text"):
-                    response_text += chunk.text
-            return response_text
-        except Exception as e:
-            err_msg = str(e)
-            if "Temporary failure in name resolution" in err_msg or "Failed to establish a new connection" in err_msg:
-                user_msg = (
-                    "Error: Unable to connect to Gemini API.\n"
-                    "Please check your internet connection and try again."
-                )
-                logging.error(user_msg)
-                return user_msg
-            logging.error(f"Error communicating with Gemini: {e}")
-            return f"Error communicating with Gemini: {e}"
-
-    def transform_apt_command(cmd):
-        # Automatically add -y flag to apt commands if missing
-        if cmd.startswith("sudo apt install") and "-y" not in cmd:
-            cmd = cmd.replace("sudo apt install", "sudo apt install -y", 1)
-        elif cmd.startswith("sudo apt upgrade") and "-y" not in cmd:
-            cmd = cmd.replace("sudo apt upgrade", "sudo apt upgrade -y", 1)
-        elif cmd.startswith("sudo apt autoremove") and "-y" not in cmd:
-            cmd = cmd.replace("sudo apt autoremove", "sudo apt autoremove -y", 1)
-        elif cmd.startswith("sudo apt purge") and "-y" not in cmd:
-            cmd = cmd.replace("sudo apt purge", "sudo apt purge -y", 1)
-        return cmd
-
-    # New PyQt5 based UI class
-    class MonitoringWidget(QWidget):
-        def __init__(self, parent=None):
-            super().__init__(parent)
-            self.cpu = 0
-            self.ram = 0
-            self.disk = 0
-            self.gpu = None  # None means not available
-            self.setMinimumHeight(90)
-            self.setMaximumHeight(110)
-            self.setStyleSheet("background: transparent;")
-
-        def set_stats(self, cpu, ram, disk, gpu=None):
-            self.cpu = cpu
-            self.ram = ram
-            self.disk = disk
-            self.gpu = gpu
-            self.update()
-
-        def _usage_color(self, percent):
-            # Smooth gradient: green (0%) -> yellow (50%) -> orange (75%) -> red (100%)
-            if percent < 50:
-                r = int(90 + (255-90)*(percent/50))
-                g = 255
-                b = 90 - int(90*(percent/50))
-                return QColor(r, g, b)
-            elif percent < 75:
-                r = 255
-                g = int(255 - (95 * ((percent-50)/25)))
-                b = 80
-                return QColor(r, g, b)
-            else:
-                r = 255
-                g = int(160 - (80 * ((percent-75)/25)))
-                b = 80 - int(80 * ((percent-75)/25))
-                return QColor(r, max(g,0), max(b,0))
-
-        def _draw_gloss(self, painter, x, y, w, h):
-            # Draw a glossy highlight on top of the bar
-            grad = QColor(255, 255, 255, 60)
-            painter.setBrush(grad)
-            painter.setPen(Qt.PenStyle.NoPen)
-            painter.drawRoundedRect(x, y, w, h//2, 10, 10)
-
-        def paintEvent(self, event):
-            painter = QPainter(self)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-            font = QFont('Segoe UI', 12, QFont.Weight.Bold)
-            painter.setFont(font)
-            stats = [("CPU", self.cpu), ("RAM", self.ram), ("Disk", self.disk)]
-            if self.gpu is not None:
-                stats.append(("GPU", self.gpu))
-            n = len(stats)
-            bar_w = max(120, (self.width() - 40 - (n-1)*30) // n)
-            bar_h = 36
-            spacing = 30
-            y = 22
-            for i, (label, percent) in enumerate(stats):
-                x = 20 + i * (bar_w + spacing)
-                # Draw shadow
-                painter.setPen(Qt.PenStyle.NoPen)
-                painter.setBrush(QColor(30, 30, 50, 110))
-                painter.drawRoundedRect(x+3, y+6, bar_w, bar_h, 12, 12)
-                # Draw background bar
-                painter.setBrush(QColor(35, 32, 66, 230))
-                painter.setPen(QColor(90, 90, 120, 180))
-                painter.drawRoundedRect(x, y, bar_w, bar_h, 12, 12)
-                # Draw usage bar with gradient color
-                usage_color = self._usage_color(percent)
-                grad = QLinearGradient(x, y, x+bar_w, y+bar_h)
-                grad.setColorAt(0, usage_color.lighter(120))
-                grad.setColorAt(1, usage_color.darker(120))
-                painter.setBrush(grad)
-                painter.setPen(Qt.PenStyle.NoPen)
-                painter.drawRoundedRect(x, y, int(bar_w * percent / 100), bar_h, 12, 12)
-                # Glossy highlight
-                self._draw_gloss(painter, x, y, int(bar_w * percent / 100), bar_h)
-                # Draw border
-                painter.setPen(QColor(120, 255, 255, 90))
-                painter.setBrush(Qt.BrushStyle.NoBrush)
-                painter.drawRoundedRect(x, y, bar_w, bar_h, 12, 12)
-                # Draw text (label and percent)
-                painter.setPen(QColor(230, 255, 255))
-                painter.setFont(QFont('Segoe UI', 11, QFont.Weight.Bold))
-                painter.drawText(x+14, y+bar_h-12, f"{label}: {percent:.0f}%")
-                # Draw animated circle indicator at the end of the bar
-                circle_x = x + int(bar_w * percent / 100)
-                circle_y = y + bar_h//2
-                painter.setBrush(usage_color.darker(130))
-                painter.setPen(QColor(80, 80, 80, 120))
-                painter.drawEllipse(circle_x-8, circle_y-8, 16, 16)
-                painter.setBrush(QColor(255,255,255,60))
-                painter.setPen(Qt.PenStyle.NoPen)
-                painter.drawEllipse(circle_x-4, circle_y-4, 8, 8)
-            # Draw a subtle bottom line for separation
-            painter.setPen(QColor(120, 255, 255, 60))
-            painter.drawLine(10, y+bar_h+10, self.width()-10, y+bar_h+10)
-            painter.end()
-
-        def sizeHint(self):
-            return QSize(600, 90)
+            self._log_inode = None
+            return
+        end = data.rfind(b"\n") + 1  # a half-written last line waits for the next call
+        if end:
+            self._log_offset += end
+            self.log_area.appendPlainText(data[:end - 1].decode("utf-8", errors="replace"))
 
     def on_send(self):
         user_input = self.command_input.text().strip()
-        if not user_input:
+        # Enter in the input box still fires while the send button is disabled
+        if not user_input or not self.send_button.isEnabled():
             return
         self.append_output(f"You: {user_input}", "user")
         # save input to history
-        self.input_history.append(user_input)
-        if not self.cmd_history or (self.cmd_history and self.cmd_history[-1] != user_input):
+        if not self.cmd_history or self.cmd_history[-1] != user_input:
             self.cmd_history.append(user_input)
         self.history_index = -1
         self.command_input.clear()
         if user_input.lower() == 'exit':
             QApplication.quit()
             return
+        elif user_input.lower() == 'refresh':
+            invalidate_system_context()
+            self.append_output("System info cache cleared.", "system")
+            return
         elif user_input.lower() == 'system status':
-            disk_info = get_disk_usage()
-            memory_info = get_memory_usage()
-            processes_info = get_running_processes()
-            network_info = get_network_interfaces()
-            uptime_info = get_system_uptime()
-            sys_status = (
-                "\n--- Current System Status ---\n"
-                + disk_info + "\n" + "-"*30 + "\n"
-                + memory_info + "\n" + "-"*30 + "\n"
-                + processes_info + "\n" + "-"*30 + "\n"
-                + network_info + "\n" + "-"*30 + "\n"
-                + uptime_info + "\n" + "-"*30 + "\n"
+            # Gathering can take a moment when the snapshot is stale, so it runs off the GUI thread
+            worker = self.StatusWorker()
+            self.status_workers.add(worker)
+            worker.signals.finished_signal.connect(
+                lambda sections: self.on_status_ready(worker, sections),
+                Qt.ConnectionType.QueuedConnection
             )
-            self.append_output(sys_status, "system")
+            QThreadPool.globalInstance().start(worker)
             return
-        gemini_response = ask_gemini_about_system(user_input)
-        self.append_output(f"Gemini: {gemini_response}", "gemini")
-        suggested_commands = re.findall(r'^COMMAND:\s*(.*)$', gemini_response, re.MULTILINE)
+        # Ask Gemini on a pool thread so the UI and monitoring timer keep running
+        worker = self.GeminiWorker(user_input)
+        self.gemini_workers.add(worker)
+        worker.signals.chunk_signal.connect(
+            lambda text: self.on_gemini_chunk(worker, text),
+            Qt.ConnectionType.QueuedConnection
+        )
+        worker.signals.finished_signal.connect(
+            lambda error_text: self.on_gemini_finished(worker, error_text),
+            Qt.ConnectionType.QueuedConnection
+        )
+        self.gemini_pool.start(worker)
+        self._update_send_enabled()
+
+    def on_status_ready(self, worker, sections):
+        self.status_workers.discard(worker)
+        # sections is (disk, memory, processes, network, uptime), each followed by a separator
+        sys_status = f"\n--- Current System Status ---\n{_STATUS_SEP.join(sections)}{_STATUS_SEP}"
+        self.append_output(sys_status, "system")
+
+    def on_gemini_chunk(self, worker, text):
+        if worker.cursor is None:
+            self.append_output("Gemini: ", "gemini")
+            # This cursor stays at the end of the answer, even if other lines are added below
+            worker.cursor = self.chat_area.textCursor()
+        self.append_stream(text, "gemini", worker.cursor)
+        # Scan only the newly completed lines for COMMAND: suggestions
+        pending = worker.stream_tail + text
+        last_nl = pending.rfind("\n")
+        if last_nl >= 0:
+            worker.suggested_commands.extend(_COMMAND_RE.findall(pending, 0, last_nl))
+            pending = pending[last_nl + 1:]
+        worker.stream_tail = pending
+
+    def on_gemini_finished(self, worker, error_text):
+        # The response itself was rendered chunk by chunk; only an error arrives here
+        self.gemini_workers.discard(worker)
+        self._update_send_enabled()
+        suggested_commands = []
+        if worker.cursor is not None:
+            suggested_commands = worker.suggested_commands + _COMMAND_RE.findall(worker.stream_tail)
+            if error_text:
+                self.append_output(error_text, "gemini")
+        else:
+            self.append_output(f"Gemini: {error_text}", "gemini")
         if suggested_commands:
             for cmd in suggested_commands:
                 self.execute_safe_command_gui(cmd)
 
-    def is_command_safe(self, command, whitelist):
-        for pattern in whitelist:
-            if re.match(pattern, command):
-                return True
-        return False
+    def is_command_safe(self, command):
+        if _SAFE_LEADING_WORDS is not None:
+            words = command.split(None, 1)
+            if not words or words[0] not in _SAFE_LEADING_WORDS:
+                return False
+        return SAFE_COMMANDS_RE.fullmatch(command) is not None
 
     def show_confirm_popup(self, title, message, on_confirm):
-        reply = QMessageBox.question(self, title, message, QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        box = self._confirm_box
+        # A prompt can be requested while the shared box is still open (e.g. from a nested
+        # event loop); that one gets a box of its own
+        if box is None or box.isVisible():
+            box = QMessageBox(QMessageBox.Icon.Question, "", "",
+                              QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, self)
+            if self._confirm_box is None:
+                self._confirm_box = box
+        box.setWindowTitle(title)
+        box.setText(message)
+        reply = box.exec()
+        if box is not self._confirm_box:
+            box.deleteLater()  # one-off box for a nested prompt
         on_confirm(reply == QMessageBox.StandardButton.Yes)
 
     def show_input_popup(self, title, message, default_text, on_submit):
@@ -757,156 +1101,426 @@ class GeminiSysAdminUI(QWidget):
         else:
             on_submit(None)
 
-    def show_progress_popup(self, title, message):
-        # if was a loading dialog, close it
-        if self.loading_dialog is not None:
-            self.loading_dialog.close()
-            self.loading_dialog = None
+    def show_progress_popup(self, title, message, on_cancel=None):
+        # Each running command keeps its own dialog: closing another one would emit its
+        # canceled signal and terminate that command
         progress = QProgressDialog(message, None, 0, 0, self)
         progress.setWindowTitle(title)
         progress.setWindowModality(Qt.WindowModality.WindowModal)
         progress.setAutoClose(False)
         progress.setMinimumDuration(0)
-        progress.setCancelButton(None)
+        if on_cancel is not None:
+            progress.setCancelButtonText("Cancel")
+            progress.canceled.connect(on_cancel)
+        else:
+            progress.setCancelButton(None)
         progress.setLabelText(message)
-        progress.setStyleSheet("""
-            QProgressDialog {
-                background-color: #232042;
-                color: #F2F2F2;
-                border-radius: 12px;
-                border: 1px solid #635985;
-            }
-            QProgressBar {
-                border: 1px solid #A3FFD6;
-                border-radius: 8px;
-                background: #18122B;
-                height: 18px;
-            }
-            QProgressBar::chunk {
-                background-color: #A3FFD6;
-                width: 20px;
-            }
-        """)
+        progress.setStyleSheet(_PROGRESS_QSS)
         progress.setValue(0)
         progress.show()
         self.loading_dialog = progress
         return progress
 
-    # New QThread worker for executing commands asynchronously:
-    class CommandWorker(QThread):
-        finished_signal = pyqtSignal(str, str)  # stdout, stderr
+    # Background sampler for the monitoring bars:
+    class StatsSampler(QThread):
+        sample_ready = pyqtSignal(float, float, float, object)  # cpu, ram, disk, gpu (None if unknown)
 
-        def __init__(self, command):
+        def __init__(self, interval_ms):
+            super().__init__()
+            self.interval_ms = interval_ms
+            self._wake = threading.Event()
+            self._stopping = False
+            # CPU usage is the busy share of the time elapsed since the previous sample;
+            # the first snapshot is taken in run(), CPU_PRIME_INTERVAL before the first reading
+            self._cpu_prev = None
+            self._disk_path = '/'
+            self._disk_polled_at = 0.0
+            self._disk_percent = 0.0
+            self._nvml = None  # pynvml module, when NVML is usable
+            self._nvml_handle = None
+            self._gputil = None
+            self._gpu_polled_at = 0.0  # last GPUtil query (it runs nvidia-smi)
+            self._gpu_percent = None
+
+        def run(self):
+            self._init_gpu()
+            self._cpu_prev = self._cpu_times()
+            deadline = time.monotonic() + CPU_PRIME_INTERVAL
+            while not self._stopping and (left := deadline - time.monotonic()) > 0:
+                self._wake.wait(left)  # an interval change must not cut the priming short
+                self._wake.clear()
+            while not self._stopping:
+                self.sample_ready.emit(*self.sample())
+                self._wake.wait(self.interval_ms / 1000)
+                self._wake.clear()
+            if self._nvml is not None:
+                try:
+                    self._nvml.nvmlShutdown()
+                except Exception:
+                    pass
+
+        def set_interval(self, interval_ms):
+            self.interval_ms = interval_ms
+            self._wake.set()
+
+        def stop(self):
+            self._stopping = True
+            self._wake.set()
+
+        @staticmethod
+        def _cpu_times():
+            """Returns (total, busy) CPU seconds across all cores since boot."""
+            t = psutil.cpu_times()
+            # guest time is already counted in user/nice on Linux
+            total = sum(t) - getattr(t, 'guest', 0) - getattr(t, 'guest_nice', 0)
+            idle = t.idle + getattr(t, 'iowait', 0)
+            return total, total - idle
+
+        def _cpu_percent(self):
+            total, busy = self._cpu_times()
+            prev_total, prev_busy = self._cpu_prev
+            self._cpu_prev = (total, busy)
+            elapsed = total - prev_total
+            if elapsed <= 0:
+                return 0.0
+            return min(100.0, max(0.0, (busy - prev_busy) / elapsed * 100))
+
+        def sample(self):
+            cpu = self._cpu_percent()
+            ram = psutil.virtual_memory().percent
+            now = time.monotonic()
+            if now - self._disk_polled_at >= DISK_POLL_INTERVAL:
+                self._disk_polled_at = now
+                self._disk_percent = psutil.disk_usage(self._disk_path).percent
+            return cpu, ram, self._disk_percent, self._read_gpu_percent()
+
+        def _init_gpu(self):
+            """Picks the GPU backend once: NVML, then GPUtil; GPU stats are left out if neither works."""
+            try:
+                import pynvml  # Optional: in-process NVML queries, no nvidia-smi subprocess
+                pynvml.nvmlInit()
+                self._nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+                self._nvml = pynvml
+                return
+            except Exception:
+                self._nvml = None  # not installed, no NVIDIA driver, or no device
+            try:
+                import GPUtil  # Optional: for GPU monitoring
+            except ImportError:
+                GPUtil = None
+            self._gputil = GPUtil
+
+        def _read_gpu_percent(self):
+            if self._nvml is not None:
+                try:
+                    return float(self._nvml.nvmlDeviceGetUtilizationRates(self._nvml_handle).gpu)
+                except Exception:
+                    return None
+            if self._gputil:
+                # GPUtil forks nvidia-smi on every call, so it is queried at most every few seconds
+                now = time.monotonic()
+                if now - self._gpu_polled_at >= GPUTIL_POLL_INTERVAL:
+                    self._gpu_polled_at = now
+                    try:
+                        gpus = self._gputil.getGPUs()
+                        self._gpu_percent = gpus[0].load * 100 if gpus else None
+                    except Exception:
+                        self._gpu_percent = None
+                return self._gpu_percent
+            return None
+
+    # Pooled worker for executing commands asynchronously:
+    # Output is streamed in batches of lines while the command runs, instead of after it exits.
+    class CommandWorker(QRunnable):
+        class Signals(QObject):
+            lines_signal = pyqtSignal(object, str)  # list of lines, stream name ("stdout" or "stderr")
+            finished_signal = pyqtSignal(int)  # return code
+
+        def __init__(self, command, stdin_text=None):
             super().__init__()
+            self.setAutoDelete(False)  # the UI holds it until finished_signal is handled
+            self.signals = self.Signals()  # QRunnable is not a QObject, so signals live here
             self.command = command
+            self.stdin_text = stdin_text  # e.g. the sudo password for 'sudo -S'
+            self.proc = None
+            self.cancel_requested = False
 
         def run(self):
+            args, use_shell = _exec_args(self.command)
             try:
-                proc = subprocess.run(self.command, shell=True, check=True, capture_output=True, text=True)
-                stdout, stderr = proc.stdout, proc.stderr
-            except subprocess.CalledProcessError as e:
-                stdout, stderr = e.stdout, e.stderr
-            except Exception as e:
-                stdout, stderr = "", str(e)
-            self.finished_signal.emit(stdout, stderr)
-
-    def _run_command_gui(self, command, skip_confirm=False):
-        # اگر skip_confirm=False باشد، بررسی Whitelist/Trusted و تأیید انجام می‌شود
-        if not skip_confirm:
-            if not self.is_command_safe(command, SAFE_COMMANDS_WHITELIST) and not self.is_command_safe(command, user_trusted_commands):
-                self.show_confirm_popup(
-                    "Confirm Command Execution",
-                    f"Command '{command}' is not recognized as safe.\nDo you really want to execute it?",
-                    lambda confirmed: self._execute_command_if_confirmed(command, confirmed)
+                # Own process group, so cancel reaches what the shell started, not just /bin/sh
+                self.proc = subprocess.Popen(
+                    args, shell=use_shell, start_new_session=True,
+                    stdin=subprocess.PIPE if self.stdin_text else subprocess.DEVNULL,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE
                 )
+            except Exception as e:
+                self.signals.lines_signal.emit([str(e)], "stderr")
+                self.signals.finished_signal.emit(-1)
                 return
+            if self.cancel_requested:
+                self._terminate()
+            if self.stdin_text:
+                try:
+                    self.proc.stdin.write(self.stdin_text.encode())
+                    self.proc.stdin.close()
+                except OSError:
+                    pass  # process exited before reading its input
+            self._pump()
+            self.signals.finished_signal.emit(self.proc.wait())
+
+        def _pump(self):
+            # Multiplex stdout and stderr on this thread so neither pipe can fill up and
+            # block the child; only the current partial line of each stream is held.
+            sel = selectors.DefaultSelector()
+            for stream, name in ((self.proc.stdout, "stdout"), (self.proc.stderr, "stderr")):
+                decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace")
+                sel.register(stream, selectors.EVENT_READ, [name, decoder, ""])
+            while sel.get_map():
+                for key, _ in sel.select():
+                    name, decoder, pending = key.data
+                    data = os.read(key.fd, COMMAND_READ_SIZE)
+                    pending += decoder.decode(data, final=not data)
+                    *lines, pending = pending.split("\n")
+                    if not data and pending:
+                        lines.append(pending)
+                        pending = ""
+                    if lines:
+                        self.signals.lines_signal.emit(lines, name)
+                    key.data[2] = pending
+                    if not data:
+                        sel.unregister(key.fileobj)
+                        key.fileobj.close()
+            sel.close()
+
+        def cancel(self):
+            self.cancel_requested = True
+            if self.proc is not None and self.proc.poll() is None:
+                self._terminate()
+
+        def _terminate(self):
+            try:
+                os.killpg(self.proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass  # the whole group has already exited
+            except PermissionError:
+                self.proc.terminate()  # e.g. only root-owned processes are left under sudo
+
+    # Pooled worker for Gemini queries, streaming the response back to the UI:
+    class GeminiWorker(QRunnable):
+        class Signals(QObject):
+            chunk_signal = pyqtSignal(str)  # streamed piece of the response
+            finished_signal = pyqtSignal(str)  # "" on success, otherwise the error message
+
+        def __init__(self, query):
+            super().__init__()
+            self.setAutoDelete(False)  # the UI holds it until finished_signal is handled
+            self.signals = self.Signals()
+            self.query = query
+            # Streaming state, only touched on the GUI thread
+            self.cursor = None  # chat position of this answer, set by the first chunk
+            self.stream_tail = ""  # streamed text after the last newline, not yet scanned
+            self.suggested_commands = []
+
+        def run(self):
+            response = ask_gemini_about_system(self.query, on_chunk=self.signals.chunk_signal.emit)
+            self.signals.finished_signal.emit(response)
 
+    class StatusWorker(QRunnable):
+        class Signals(QObject):
+            finished_signal = pyqtSignal(object)  # the get_system_snapshot() tuple
+
+        def __init__(self):
+            super().__init__()
+            self.setAutoDelete(False)  # the UI holds it until finished_signal is handled
+            self.signals = self.Signals()
+
+        def run(self):
+            self.signals.finished_signal.emit(get_system_snapshot())
+
+    def _ask_password(self):
+        """Asks for the root password in the shared password dialog; returns None if cancelled."""
+        dialog = self._password_dialog
+        if dialog is None or dialog.isVisible():
+            dialog = QInputDialog(self)
+            dialog.setWindowTitle("Root Password")
+            dialog.setLabelText("Enter root password:")
+            dialog.setTextEchoMode(QLineEdit.EchoMode.Password)
+            if self._password_dialog is None:
+                self._password_dialog = dialog
+        dialog.setTextValue("")  # never show the previous password
+        accepted = dialog.exec() == QInputDialog.DialogCode.Accepted
+        password = dialog.textValue() if accepted else None
+        dialog.setTextValue("")
+        if dialog is not self._password_dialog:
+            dialog.deleteLater()  # one-off dialog for a nested prompt
+        return password
+
+    def _prepare_command(self, command, needs_sudo):
+        """
+        Returns (command, stdin_text) ready to run, or None if the user cancelled the
+        password prompt. The command is transformed exactly once here.
+        """
         # اگر دستور مربوط به sudo است و گزینه -S ندارد، از کاربر رمز روت می‌گیرد.
-        if "sudo" in command and "-S" not in command:
-            from PyQt6.QtWidgets import QInputDialog, QLineEdit
-            password, ok = QInputDialog.getText(self, "Root Password", "Enter root password:", QLineEdit.EchoMode.Password)
-            if not ok or not password:
-                self.append_output("Password not provided. Command cancelled.", "command")
-                self.command_input.setEnabled(True)
-                self.send_button.setEnabled(True)
-                self.clear_button.setEnabled(True)
-                return
-            command = command.replace("sudo", "sudo -S", 1)
-            command = "echo " + shlex.quote(password) + " | " + command
+        # The password is written to the process stdin, never placed on a command line.
+        stdin_text = None
+        if needs_sudo:
+            password = self._ask_password()
+            if not password:
+                return None
+            # needs_sudo means the first shell word is sudo, so -S goes right after it; the
+            # rest is kept verbatim, since re-quoting it with shlex.join would break '&&'
+            command = " ".join(["sudo", "-S", *command.split(None, 1)[1:]])
+            stdin_text = password + "\n"
 
         # Add apt non-interactive flag if needed
-        command = transform_apt_command(command)
-        
+        return transform_apt_command(command), stdin_text
+
+    def _run_command_gui(self, command, needs_sudo):
+        # The safety check and confirmation happen once, in execute_safe_command_gui
+        prepared = self._prepare_command(command, needs_sudo)
+        if prepared is None:
+            self.append_output("Password not provided. Command cancelled.", "command")
+            self._set_inputs_enabled(True)
+            return
+        command, stdin_text = prepared
+
         # تشخیص اجرای برنامه گرافیکی و عدم نمایش لودینگ برای آن
-        gui_apps = ["google-chrome", "firefox", "chromium", "code", "gedit", "vlc", "nautilus", "dolphin"]
-        is_gui = False
-        for app in gui_apps:
-            if command.strip().startswith(app) or f" {app}" in command:
-                is_gui = True
-                break
+        args, use_shell = _exec_args(command)
+        # The program is argv[0]; for shell commands, the first word
+        program = (command.split(None, 1) or [""])[0] if use_shell else args[0]
+        is_gui = os.path.basename(program) in GUI_APPS
 
         if is_gui:
             try:
-                subprocess.Popen(command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                proc = subprocess.Popen(args, shell=use_shell, start_new_session=True,
+                                        stdin=subprocess.PIPE if stdin_text else subprocess.DEVNULL,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True)
+                if stdin_text:
+                    proc.stdin.write(stdin_text)
+                    proc.stdin.close()
                 self.append_output(f"Launched: {command}", "command")
             except Exception as e:
                 self.append_output(f"خطا:\n{str(e)}", "command")
-            self.command_input.setEnabled(True)
-            self.send_button.setEnabled(True)
-            self.clear_button.setEnabled(True)
+            self._set_inputs_enabled(True)
             return
 
+        self._spawn_command(command, stdin_text)
+
+    def _spawn_command(self, command, stdin_text=None):
+        """Runs a prepared command on a CommandWorker, streaming its output into the chat."""
         # غیرفعال کردن ورودی تا پایان اجرا
-        self.command_input.setEnabled(False)
-        self.send_button.setEnabled(False)
-        self.clear_button.setEnabled(False)
-
-        progress = self.show_progress_popup("لطفاً صبر کن", "در حال اجرای فرمان…")
-        worker = self.CommandWorker(transform_apt_command(command))
-        self.active_threads.append(worker)  # Track the running thread
-        worker.finished_signal.connect(lambda out, err: self.on_command_finished_wrapper(worker, out, err, progress))
-        worker.start()
-
-    def on_command_finished_wrapper(self, worker, stdout, stderr, progress):
-        if worker in self.active_threads:
-            self.active_threads.remove(worker)
-        self.on_command_finished(stdout, stderr, progress)
-
-    def on_command_finished(self, stdout, stderr, progress):
+        self._set_inputs_enabled(False)
+        worker = self.CommandWorker(command, stdin_text)
+        progress = self.show_progress_popup("لطفاً صبر کن", "در حال اجرای فرمان…", on_cancel=worker.cancel)
+        self.running_commands.add(worker)
+        worker.signals.lines_signal.connect(self.on_command_lines, Qt.ConnectionType.QueuedConnection)
+        # Completion is pushed from the worker thread; nothing polls for it on the GUI side
+        worker.signals.finished_signal.connect(
+            lambda returncode: self.on_command_finished(worker, returncode, progress),
+            Qt.ConnectionType.QueuedConnection
+        )
+        self.command_pool.start(worker)
+
+    def on_command_lines(self, lines, stream):
+        tag = "command" if stream == "stderr" else None
+        self._pending_lines.extend((tag, line) for line in lines)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def flush_pending_output(self):
+        """Writes buffered command output, one insert per run of lines with the same tag."""
+        self._flush_timer.stop()
+        if not self._pending_lines:
+            return
+        pending, self._pending_lines = self._pending_lines, []
+        self._append_lines(
+            ("\n".join(line for _, line in group), tag)
+            for tag, group in itertools.groupby(pending, key=lambda item: item[0])
+        )
+
+    def on_command_finished(self, worker, returncode, progress):
+        # Single completion slot: forget the worker, close the dialog, report, re-enable input
+        self.running_commands.discard(worker)
+        self.flush_pending_output()
         if progress:
+            progress.canceled.disconnect()  # closing the dialog emits canceled as well
             progress.close()
-        if stdout:
-            self.output_area.append(stdout)
-        if stderr:
-            self.output_area.append(f"خطا:\n{stderr}")
-        self.command_input.setEnabled(True)
-        self.send_button.setEnabled(True)
-        self.clear_button.setEnabled(True)
+            if self.loading_dialog is progress:
+                self.loading_dialog = None
+        if worker.cancel_requested:
+            self.append_output("Command cancelled.", "command")
+        elif returncode != 0:
+            self.append_output(f"Command exited with code {returncode}.", "command")
+        self._set_inputs_enabled(True)
+
+    def _set_inputs_enabled(self, enabled):
+        self.command_input.setEnabled(enabled)
+        self.clear_button.setEnabled(enabled)
+        self._update_send_enabled()
+
+    def _update_send_enabled(self):
+        # Backpressure: no new queries while GEMINI_MAX_PENDING are already queued or running
+        self.send_button.setEnabled(
+            self.command_input.isEnabled() and len(self.gemini_workers) < GEMINI_MAX_PENDING
+        )
 
     def execute_safe_command_gui(self, command):
+        # The checked string is the one that runs, without stray spaces or a trailing '\r'
+        command = command.strip()
+        # Only a real leading 'sudo' token asks for a password ('echo sudo' does not)
+        try:
+            tokens = shlex.split(command)
+        except ValueError:
+            tokens = []
+        needs_sudo = tokens[:1] == ["sudo"] and "-S" not in tokens
         # فقط یک بار بررسی و تأیید انجام شود
-        if not self.is_command_safe(command, SAFE_COMMANDS_WHITELIST) and not self.is_command_safe(command, user_trusted_commands):
+        # Exact trusted match first (set lookup), then the whitelist patterns
+        is_safe = (command in user_trusted_commands
+                   or self.is_command_safe(command))
+        if not is_safe:
             self.show_confirm_popup(
                 "Confirm Command Execution",
                 f"Command '{command}' is not recognized as safe.\nDo you really want to execute it?",
-                lambda confirmed: self._execute_command_if_confirmed(command, confirmed)
+                lambda confirmed: self._execute_command_if_confirmed(command, confirmed, needs_sudo)
             )
             return
 
-        # اگر تأیید شد، skip_confirm=True تا دیگر پیام نیاید
-        self._run_command_gui(command, skip_confirm=True)
+        self._run_command_gui(command, needs_sudo)
 
-    def _execute_command_if_confirmed(self, command, confirmed):
+    def _execute_command_if_confirmed(self, command, confirmed, needs_sudo):
         if confirmed:
-            self._run_command_gui(command, skip_confirm=True)
+            self._run_command_gui(command, needs_sudo)
         else:
             self.append_output("Command execution canceled.", "command")
 
 # ...existing code...
 
     def clear_output(self):
-        """Clear the output QTextEdit completely."""
-        self.output_area.clear()
+        """Clear the chat output completely."""
+        self._pending_lines.clear()
+        self.chat_area.clear()
+
+    def _update_monitor_interval(self):
+        # Nobody sees the bars while the window is hidden or minimized, so sample less often
+        hidden = not self.isVisible() or self.isMinimized()
+        interval = MONITOR_HIDDEN_INTERVAL_MS if hidden else MONITOR_INTERVAL_MS
+        if self.sampler.interval_ms != interval:
+            # Waking the sampler refreshes the bars right away when the window comes back
+            self.sampler.set_interval(interval)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._update_monitor_interval()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._update_monitor_interval()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.WindowStateChange:
+            self._update_monitor_interval()
     
     def eventFilter(self, source, event):
         if source == self.command_input and event.type() == QEvent.Type.KeyPress:
@@ -930,19 +1544,26 @@ class GeminiSysAdminUI(QWidget):
         """
             when the window is closed, wait for all threads to finish
         """
-        # Wait for all active threads to finish
-        for thread in self.active_threads:
-            thread.wait(3000)  # wait up to 3000 ms for each thread
+        # Ask everything to stop first, then wait against one shared deadline, so shutdown
+        # takes at most SHUTDOWN_TIMEOUT_MS in total instead of the sum of the waits
+        self.sampler.stop()
+        self.gemini_pool.clear()  # drop queries that have not started yet
+        self.command_pool.clear()
+        for worker in self.running_commands:
+            worker.cancel()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT_MS / 1000
+
+        def remaining_ms():
+            return max(0, int((deadline - time.monotonic()) * 1000))
+
+        self.sampler.wait(remaining_ms())
+        self.gemini_pool.waitForDone(remaining_ms())
+        self.command_pool.waitForDone(remaining_ms())
+        QThreadPool.globalInstance().waitForDone(remaining_ms())  # 'system status' workers
         if self.loading_dialog:
             self.loading_dialog.close()
             self.loading_dialog = None
         event.accept()
-
-    def _execute_command_if_confirmed(self, command, confirmed):
-        if confirmed:
-            self._run_command_gui(command, skip_confirm=True)
-        else:
-            self.append_output("Command execution canceled.", "command")
     
 # New main function using PyQt5
 def main():